@@ -1,8 +1,10 @@
+import io
 import streamlit as st
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import plotly.graph_objects as go
+
+# Hash DataFrames by content so cached plot builders only rerun when the data changes
+DATAFRAME_HASH_FUNCS = {pd.DataFrame: lambda df: pd.util.hash_pandas_object(df, index=True).values.tobytes()}
 
 def main():
     st.set_page_config(page_title="Zephara Xcel Home Financing Simulator", layout="wide")
@@ -26,6 +28,9 @@ def main():
     if annual_rental_yield <= 0 or annual_rental_yield >= 1:
         st.error("Error: Annual rental yield must be between 0% and 100%.")
         return
+    if traditional_interest_rate <= 0:
+        st.error("Error: Traditional loan interest rate must be greater than 0%.")
+        return
     if zx_loan_tenure_years <= 0 or traditional_loan_tenure_years <= 0:
         st.error("Error: Loan tenure must be a positive number.")
         return
@@ -34,22 +39,39 @@ def main():
     zx_loan_tenure_months = int(zx_loan_tenure_years * 12)
     traditional_loan_tenure_months = int(traditional_loan_tenure_years * 12)
 
-    # Simulate Zephara Xcel Model
-    zx_simulation_df, zx_metrics = zx_simulator(
+    # Only rerun the simulators when an input actually changed
+    simulation_key = (
         property_price,
         customer_initial_contribution,
         annual_rental_yield,
-        zx_loan_tenure_months
-    )
-
-    # Simulate Traditional Loan Model
-    traditional_principal_amount = property_price - customer_initial_contribution
-    traditional_simulation_df, traditional_metrics = traditional_loan_simulator(
-        traditional_principal_amount,
+        zx_loan_tenure_months,
         traditional_interest_rate,
         traditional_loan_tenure_months
     )
+    if st.session_state.get('simulation_key') != simulation_key:
+        # Simulate Zephara Xcel Model
+        zx_simulation_df, zx_metrics = zx_simulator(
+            property_price,
+            customer_initial_contribution,
+            annual_rental_yield,
+            zx_loan_tenure_months
+        )
 
+        # Simulate Traditional Loan Model
+        traditional_principal_amount = property_price - customer_initial_contribution
+        traditional_simulation_df, traditional_metrics = traditional_loan_simulator(
+            traditional_principal_amount,
+            traditional_interest_rate,
+            traditional_loan_tenure_months
+        )
+
+        st.session_state['simulation_key'] = simulation_key
+        st.session_state['simulation_results'] = (zx_simulation_df, traditional_simulation_df, zx_metrics, traditional_metrics)
+
+    render_results(*st.session_state['simulation_results'])
+
+@st.fragment
+def render_results(zx_simulation_df, traditional_simulation_df, zx_metrics, traditional_metrics):
     # Display Results
     st.header("Simulation Results")
 
@@ -57,13 +79,12 @@ def main():
     st.subheader("Key Metrics Comparison")
 
     metrics_data = {
-        'Metric': ['Monthly Payment', 'Total EMI Paid', 'Total Interest/Rental Paid', 'Total Principal/Buyback Paid', 'Total Payment', 'Bank Profit'],
+        'Metric': ['Monthly Payment', 'Total EMI Paid', 'Total Interest/Rental Paid', 'Total Principal/Buyback Paid', 'Bank Profit'],
         'Zephara Xcel Model (INR)': [
             zx_metrics['monthly_payment'],
             zx_metrics['total_emi_paid'],
             zx_metrics['total_rental_income'],
             zx_metrics['total_buyback_amount'],
-            zx_metrics['total_emi_paid'],
             zx_metrics['bank_profit']
         ],
         'Traditional Loan Model (INR)': [
@@ -71,7 +92,6 @@ def main():
             traditional_metrics['total_emi_paid'],
             traditional_metrics['total_interest_paid'],
             traditional_metrics['total_principal_paid'],
-            traditional_metrics['total_emi_paid'],
             traditional_metrics['bank_profit']
         ]
     }
@@ -87,36 +107,40 @@ def main():
     # Graphs Side by Side
     st.subheader("Ownership Transition Over Time")
 
-    col1, col2 = st.columns(2)
-
-    with col1:
-        st.markdown("**Zephara Xcel Model**")
-        fig1 = plot_ownership_transition(zx_simulation_df, 'ZX')
-        st.plotly_chart(fig1, use_container_width=True)
-
-    with col2:
-        st.markdown("**Traditional Loan Model**")
-        fig2 = plot_outstanding_balance(traditional_simulation_df)
-        st.plotly_chart(fig2, use_container_width=True)
+    fig1 = plot_ownership_and_balance(zx_simulation_df, traditional_simulation_df)
+    st.plotly_chart(fig1, use_container_width=True)
 
     # EMI Breakdown
     st.subheader("EMI Breakdown Over Time")
 
-    fig3 = plot_emi_breakdown(zx_simulation_df, traditional_simulation_df)
-    st.plotly_chart(fig3, use_container_width=True)
+    fig2 = plot_emi_breakdown(zx_simulation_df, traditional_simulation_df)
+    st.plotly_chart(fig2, use_container_width=True)
 
     # Detailed Tables
     st.subheader("Detailed Simulation Data")
     with st.expander("Zephara Xcel Model Data"):
-        st.dataframe(zx_simulation_df.style.format("{:,.2f}"))
+        show_simulation_table(zx_simulation_df)
 
     with st.expander("Traditional Loan Model Data"):
-        st.dataframe(traditional_simulation_df.style.format("{:,.2f}"))
+        show_simulation_table(traditional_simulation_df)
 
     # Option to Download Data
     st.subheader("Download Simulation Data")
     download_data(zx_simulation_df, traditional_simulation_df)
 
+def amortization_schedule(principal_amount, r, EMI, pow_n, outstanding_balance, principal_payment, interest_payment):
+    # Outstanding balance after each month (closed-form amortization), written into the given arrays.
+    # P*(1+r)**n - EMI*((1+r)**n - 1)/r == (P - EMI/r)*(1+r)**n + EMI/r, evaluated in place
+    np.multiply(pow_n, principal_amount - EMI / r, out=outstanding_balance)
+    np.add(outstanding_balance, EMI / r, out=outstanding_balance)
+    outstanding_balance[-1] = 0.0  # Exactly zero at n = T; drop the floating-point residue
+
+    # Principal repaid is the drop in balance; the rest of the EMI is interest
+    principal_payment[0] = principal_amount - outstanding_balance[0]
+    np.subtract(outstanding_balance[:-1], outstanding_balance[1:], out=principal_payment[1:])
+    np.subtract(EMI, principal_payment, out=interest_payment)
+
+@st.cache_data(max_entries=64, ttl="1h")
 def zx_simulator(property_price, customer_initial_contribution, annual_rental_yield, loan_tenure_months):
     # Initial Calculations
     nbfc_initial_contribution = property_price - customer_initial_contribution
@@ -124,60 +148,43 @@ def zx_simulator(property_price, customer_initial_contribution, annual_rental_yi
     T = loan_tenure_months
     r = monthly_rental_rate
 
-    # Calculate EMI
-    EMI = (nbfc_initial_contribution * r * (1 + r)**T) / ((1 + r)**T - 1)
-
-    # Initialize lists to store simulation data
-    months = []
-    emi_list = []
-    rental_income_list = []
-    buyback_amount_list = []
-    nbfc_share_percentage_list = []
-    customer_share_percentage_list = []
-    nbfc_share_value_list = []
-    customer_share_value_list = []
-
-    # Initial shares
-    nbfc_share_value = nbfc_initial_contribution
-    customer_share_value = customer_initial_contribution
-
-    # Simulation Loop
-    for n in range(1, T + 1):
-        rental_income = nbfc_share_value * r
-        buyback_amount = EMI - rental_income
-        nbfc_share_value -= buyback_amount
-        customer_share_value += buyback_amount
-
-        # Store data
-        months.append(n)
-        emi_list.append(EMI)
-        rental_income_list.append(rental_income)
-        buyback_amount_list.append(buyback_amount)
-        nbfc_share_percentage_list.append(nbfc_share_value / property_price * 100)  # Percentage
-        customer_share_percentage_list.append(customer_share_value / property_price * 100)  # Percentage
-        nbfc_share_value_list.append(nbfc_share_value)
-        customer_share_value_list.append(customer_share_value)
+    # Calculate EMI, reusing the month-by-month growth factors (1 + r)**n
+    months = np.arange(1, T + 1)
+    pow_n = (1 + r) ** months
+    pow_rT = pow_n[-1]
+    EMI = nbfc_initial_contribution * r * pow_rT / (pow_rT - 1)
+
+    # Fill one preallocated block, column by column
+    data = np.empty((T, 7), order='F')
+    emi_column, rental_income, buyback_amount, nbfc_share_percentage, customer_share_percentage, nbfc_share_value, customer_share_value = data.T
+
+    # Buyback plays the role of principal and rental income that of interest
+    emi_column[:] = EMI
+    amortization_schedule(nbfc_initial_contribution, r, EMI, pow_n, nbfc_share_value, buyback_amount, rental_income)
+    np.subtract(property_price, nbfc_share_value, out=customer_share_value)
+    np.multiply(nbfc_share_value, 100 / property_price, out=nbfc_share_percentage)  # Percentage
+    np.multiply(customer_share_value, 100 / property_price, out=customer_share_percentage)  # Percentage
 
     # Create DataFrame
-    simulation_df = pd.DataFrame({
-        'Month': months,
-        'EMI (INR)': emi_list,
-        'Rental Income (INR)': rental_income_list,
-        'Buyback Amount (INR)': buyback_amount_list,
-        'NBFC Ownership (%)': nbfc_share_percentage_list,
-        'Customer Ownership (%)': customer_share_percentage_list,
-        'NBFC Share Value (INR)': nbfc_share_value_list,
-        'Customer Share Value (INR)': customer_share_value_list
-    })
+    simulation_df = pd.DataFrame(data, columns=[
+        'EMI (INR)',
+        'Rental Income (INR)',
+        'Buyback Amount (INR)',
+        'NBFC Ownership (%)',
+        'Customer Ownership (%)',
+        'NBFC Share Value (INR)',
+        'Customer Share Value (INR)'
+    ])
+    simulation_df.insert(0, 'Month', months)
 
     # Calculate Metrics
-    total_emi_paid = simulation_df['EMI (INR)'].sum()
-    total_rental_income = simulation_df['Rental Income (INR)'].sum()
-    total_buyback_amount = simulation_df['Buyback Amount (INR)'].sum()
+    total_emi_paid = float(EMI * T)
+    total_rental_income = float(rental_income.sum())
+    total_buyback_amount = float(buyback_amount.sum())
     bank_profit = total_rental_income  # In ZX model, bank profit is the rental income
 
     metrics = {
-        'monthly_payment': EMI,
+        'monthly_payment': float(EMI),
         'total_emi_paid': total_emi_paid,
         'total_rental_income': total_rental_income,
         'total_buyback_amount': total_buyback_amount,
@@ -186,54 +193,42 @@ def zx_simulator(property_price, customer_initial_contribution, annual_rental_yi
 
     return simulation_df, metrics
 
+@st.cache_data(max_entries=64, ttl="1h")
 def traditional_loan_simulator(principal_amount, annual_interest_rate, loan_tenure_months):
     # Calculate monthly interest rate
     r = annual_interest_rate / 12
     T = loan_tenure_months
 
-    # Calculate EMI
-    EMI = (principal_amount * r * (1 + r)**T) / ((1 + r)**T - 1)
+    # Calculate EMI, reusing the month-by-month growth factors (1 + r)**n
+    months = np.arange(1, T + 1)
+    pow_n = (1 + r) ** months
+    pow_rT = pow_n[-1]
+    EMI = principal_amount * r * pow_rT / (pow_rT - 1)
 
-    # Initialize lists to store simulation data
-    months = []
-    emi_list = []
-    interest_paid_list = []
-    principal_paid_list = []
-    outstanding_balance_list = []
+    # Fill one preallocated block, column by column
+    data = np.empty((T, 4), order='F')
+    emi_column, interest_payment, principal_payment, outstanding_balance = data.T
 
-    # Initial outstanding balance
-    outstanding_balance = principal_amount
-
-    # Simulation Loop
-    for n in range(1, T + 1):
-        interest_payment = outstanding_balance * r
-        principal_payment = EMI - interest_payment
-        outstanding_balance -= principal_payment
-
-        # Store data
-        months.append(n)
-        emi_list.append(EMI)
-        interest_paid_list.append(interest_payment)
-        principal_paid_list.append(principal_payment)
-        outstanding_balance_list.append(outstanding_balance)
+    emi_column[:] = EMI
+    amortization_schedule(principal_amount, r, EMI, pow_n, outstanding_balance, principal_payment, interest_payment)
 
     # Create DataFrame
-    simulation_df = pd.DataFrame({
-        'Month': months,
-        'EMI (INR)': emi_list,
-        'Interest Paid (INR)': interest_paid_list,
-        'Principal Paid (INR)': principal_paid_list,
-        'Outstanding Balance (INR)': outstanding_balance_list
-    })
+    simulation_df = pd.DataFrame(data, columns=[
+        'EMI (INR)',
+        'Interest Paid (INR)',
+        'Principal Paid (INR)',
+        'Outstanding Balance (INR)'
+    ])
+    simulation_df.insert(0, 'Month', months)
 
     # Calculate Metrics
-    total_emi_paid = simulation_df['EMI (INR)'].sum()
-    total_interest_paid = simulation_df['Interest Paid (INR)'].sum()
-    total_principal_paid = simulation_df['Principal Paid (INR)'].sum()
+    total_emi_paid = float(EMI * T)
+    total_interest_paid = float(interest_payment.sum())
+    total_principal_paid = float(principal_payment.sum())
     bank_profit = total_interest_paid  # In traditional loan, bank profit is the interest paid
 
     metrics = {
-        'monthly_payment': EMI,
+        'monthly_payment': float(EMI),
         'total_emi_paid': total_emi_paid,
         'total_interest_paid': total_interest_paid,
         'total_principal_paid': total_principal_paid,
@@ -242,56 +237,56 @@ def traditional_loan_simulator(principal_amount, annual_interest_rate, loan_tenu
 
     return simulation_df, metrics
 
-def plot_ownership_transition(simulation_df, model_type):
-    fig = go.Figure()
-    if model_type == 'ZX':
-        fig.add_trace(go.Scatter(
-            x=simulation_df['Month'],
-            y=simulation_df['NBFC Ownership (%)'],
-            mode='lines',
-            name='NBFC Ownership (%)'
-        ))
-        fig.add_trace(go.Scatter(
-            x=simulation_df['Month'],
-            y=simulation_df['Customer Ownership (%)'],
-            mode='lines',
-            name='Customer Ownership (%)'
-        ))
-        fig.update_layout(
-            title='Ownership Transition Over Time',
-            xaxis_title='Month',
-            yaxis_title='Ownership Percentage',
-            legend_title='Legend'
-        )
-    return fig
+@st.cache_data(max_entries=64, ttl="1h", hash_funcs=DATAFRAME_HASH_FUNCS)
+def plot_ownership_and_balance(zx_df, traditional_df):
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
 
-def plot_outstanding_balance(simulation_df):
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(
-        x=simulation_df['Month'],
-        y=simulation_df['Outstanding Balance (INR)'],
+    fig = make_subplots(rows=1, cols=2, subplot_titles=('Zephara Xcel Model', 'Traditional Loan Model'))
+
+    # ZX Model: ownership transition
+    fig.add_trace(go.Scattergl(
+        x=zx_df['Month'],
+        y=zx_df['NBFC Ownership (%)'],
+        mode='lines',
+        name='NBFC Ownership (%)'
+    ), row=1, col=1)
+    fig.add_trace(go.Scattergl(
+        x=zx_df['Month'],
+        y=zx_df['Customer Ownership (%)'],
+        mode='lines',
+        name='Customer Ownership (%)'
+    ), row=1, col=1)
+
+    # Traditional Loan Model: outstanding balance
+    fig.add_trace(go.Scattergl(
+        x=traditional_df['Month'],
+        y=traditional_df['Outstanding Balance (INR)'],
         mode='lines',
         name='Outstanding Balance (INR)'
-    ))
-    fig.update_layout(
-        title='Outstanding Balance Over Time',
-        xaxis_title='Month',
-        yaxis_title='Outstanding Balance (INR)',
-        legend_title='Legend'
-    )
+    ), row=1, col=2)
+
+    fig.update_xaxes(title_text='Month', row=1, col=1)
+    fig.update_xaxes(title_text='Month', row=1, col=2)
+    fig.update_yaxes(title_text='Ownership Percentage', row=1, col=1)
+    fig.update_yaxes(title_text='Outstanding Balance (INR)', row=1, col=2)
+    fig.update_layout(legend_title='Legend')
     return fig
 
+@st.cache_data(max_entries=64, ttl="1h", hash_funcs=DATAFRAME_HASH_FUNCS)
 def plot_emi_breakdown(zx_df, traditional_df):
+    import plotly.graph_objects as go
+
     fig = go.Figure()
 
     # ZX Model
-    fig.add_trace(go.Scatter(
+    fig.add_trace(go.Scattergl(
         x=zx_df['Month'],
         y=zx_df['Rental Income (INR)'],
         mode='lines',
         name='ZX Rental Income'
     ))
-    fig.add_trace(go.Scatter(
+    fig.add_trace(go.Scattergl(
         x=zx_df['Month'],
         y=zx_df['Buyback Amount (INR)'],
         mode='lines',
@@ -299,13 +294,13 @@ def plot_emi_breakdown(zx_df, traditional_df):
     ))
 
     # Traditional Loan Model
-    fig.add_trace(go.Scatter(
+    fig.add_trace(go.Scattergl(
         x=traditional_df['Month'],
         y=traditional_df['Interest Paid (INR)'],
         mode='lines',
         name='Traditional Interest Paid'
     ))
-    fig.add_trace(go.Scatter(
+    fig.add_trace(go.Scattergl(
         x=traditional_df['Month'],
         y=traditional_df['Principal Paid (INR)'],
         mode='lines',
@@ -320,18 +315,30 @@ def plot_emi_breakdown(zx_df, traditional_df):
     )
     return fig
 
-def download_data(zx_df, traditional_df):
-    # Combine data into Excel file
-    with pd.ExcelWriter("simulation_data.xlsx") as writer:
+def show_simulation_table(simulation_df):
+    # Let the browser format numbers ("1,234.00") instead of running Styler.format per cell
+    st.dataframe(
+        simulation_df,
+        column_config={col: st.column_config.NumberColumn(format="accounting") for col in simulation_df.columns if col != 'Month'}
+    )
+
+@st.cache_data(max_entries=64, ttl="1h", hash_funcs=DATAFRAME_HASH_FUNCS)
+def _build_xlsx(zx_df, traditional_df):
+    # Combine data into an in-memory Excel file
+    buf = io.BytesIO()
+    with pd.ExcelWriter(buf, engine="openpyxl") as writer:
         zx_df.to_excel(writer, sheet_name='Zephara Xcel Model', index=False)
         traditional_df.to_excel(writer, sheet_name='Traditional Loan Model', index=False)
-    with open("simulation_data.xlsx", "rb") as file:
-        btn = st.download_button(
-            label="Download Simulation Data",
-            data=file,
-            file_name="simulation_data.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
+    return buf.getvalue()
+
+@st.fragment
+def download_data(zx_df, traditional_df):
+    st.download_button(
+        label="Download Simulation Data",
+        data=_build_xlsx(zx_df, traditional_df),
+        file_name="simulation_data.xlsx",
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    )
 
 if __name__ == '__main__':
     main()